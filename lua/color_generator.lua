@@ -9,36 +9,33 @@ local _SATURATE_FLOOR = 0.75
 local _VALUE_FLOOR = 0.75
 local _HUE_CEILING = 0.80
 
+-- Channel order for each hue sector
+local _HSV_SECTORS = {
+  [0] = function(v, t, p, q) return v, t, p end,
+  [1] = function(v, t, p, q) return q, v, p end,
+  [2] = function(v, t, p, q) return p, v, t end,
+  [3] = function(v, t, p, q) return p, q, v end,
+  [4] = function(v, t, p, q) return t, p, v end,
+  [5] = function(v, t, p, q) return v, p, q end,
+}
+
+-- Two digit hex string for every channel value
+local _HEX = {}
+for i = 0, 255 do
+  _HEX[i] = string.format("%02X", i)
+end
+
 local function hsv_to_rgb(h, s, v)
-  local h_i = math.floor(h * 6)
-  local f = h * 6 - h_i
+  local i = math.floor(h * 6)
+  local h_i = i % 6
+  local f = h * 6 - i
   local p = v * (1 - s)
   local q = v * (1 - f * s)
   local t = v * (1 - (1 - f) * s)
-  local r = 0
-  local g = 0
-  local b = 0
-  if h_i == 0 then
-    r, g, b = v, t, p
-  end
-  if h_i == 1 then
-    r, g, b = q, v, p
-  end
-  if h_i == 2 then
-    r, g, b = p, v, t
-  end
-  if h_i == 3 then
-    r, g, b = p, q, v
-  end
-  if h_i == 4 then
-    r, g, b = t, p, v
-  end
-  if h_i == 5 then
-    r, g, b = v, p, q
-  end
-  local r_hex = string.format("%02X", math.floor(r * 256))
-  local g_hex = string.format("%02X", math.floor(g * 256))
-  local b_hex = string.format("%02X", math.floor(b * 256))
+  local r, g, b = _HSV_SECTORS[h_i](v, t, p, q)
+  local r_hex = _HEX[math.min(255, math.floor(r * 256))]
+  local g_hex = _HEX[math.min(255, math.floor(g * 256))]
+  local b_hex = _HEX[math.min(255, math.floor(b * 256))]
   return "#" .. r_hex .. g_hex .. b_hex
 end
 
@@ -10,17 +10,15 @@ M.normalized_hash = function(in_str)
   local val = 0
   local h = M.hash(in_str)
   for i=1, #h do
-    val = (val + string.byte(h:sub(i,i))) % 256
+    val = (val + string.byte(h, i)) % 256
   end
   return val / 256
 end
 
 M.hash_hsv = function(in_str)
   local hash_val = M.hash(in_str)
-  local h = string.byte(hash_val:sub(1,1)) / 256
-  local s = string.byte(hash_val:sub(2,2)) / 256
-  local v = string.byte(hash_val:sub(3,3)) / 256
-  return {h, s, v}
+  local h, s, v = string.byte(hash_val, 1, 3)
+  return {h / 256, s / 256, v / 256}
 end
 
 
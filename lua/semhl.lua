@@ -2,73 +2,81 @@ local M = {}
 
 M._HIGHLIGHT_CACHE = {}
 M._WORD_CACHE = {}
+M._ATTACHED_BUFFERS = {}
+M._LOADED_TICKS = {}
+
+-- Node types to highlight, keyed by type for constant time lookup
+local _IDENTIFIER_TYPES = {
+  identifier = true,
+  type_identifier = true,
+  field_identifier = true,
+}
 
 local function create_highlight(ns, rgb_hex)
   rgb_hex = rgb_hex:lower()
-  local cache_key = table.concat({ "sfg", rgb_hex }, "_")
+  local cache_key = "sfg_" .. rgb_hex
   local highlight_name = M._HIGHLIGHT_CACHE[cache_key]
 
-
-  -- Look up in our cache.
+  -- Look up in our cache. Groups are only ever added to the cache right after
+  -- nvim_set_hl, so a hit means the group already exists in the namespace.
   if highlight_name then
-    local hl_id = vim.api.nvim_get_hl_id_by_name(highlight_name)
-    if hl_id then
-      return highlight_name
-    end
+    return highlight_name
   end
 
-  -- Create the highlight
-  highlight_name = table.concat({ "sfg", rgb_hex }, "_")
+  -- Create the highlight, the cache key doubles as the group name
+  highlight_name = cache_key
   vim.api.nvim_set_hl(ns, highlight_name, { fg = "#" .. rgb_hex })
   M._HIGHLIGHT_CACHE[cache_key] = highlight_name
   return highlight_name
 end
 
-local function recursive_child_iter(node, table_to_insert, desired_types)
-  if node:iter_children() then
-    for child in node:iter_children() do
+-- Only named nodes are visited, anonymous nodes are punctuation and keyword
+-- tokens which never are, nor contain, identifiers. iter_children walks with a
+-- tree cursor, indexing with named_child(i) rescans from the first child.
+local function recursive_child_iter(node, on_node, desired_types)
+  for child in node:iter_children() do
+    if child:named() then
       if desired_types then
-        if vim.tbl_contains(desired_types, child:type()) then
-          table.insert(table_to_insert, child)
+        if desired_types[child:type()] then
+          on_node(child)
         end
       else
-        table.insert(table_to_insert, child)
+        on_node(child)
       end
 
-      recursive_child_iter(child, table_to_insert, desired_types)
+      recursive_child_iter(child, on_node, desired_types)
     end
   end
 end
 
+-- Yanked from https://github.com/nvim-treesitter/nvim-treesitter/blob/32e364ea3c99aafcce2ce735fe091618f623d889/lua/nvim-treesitter/parsers.lua#L4-L21
+local _FILETYPE_TO_PARSERNAME = {
+  proto = "c",
+  arduino = "cpp",
+  javascriptreact = "javascript",
+  ecma = "javascript",
+  jsx = "javascript",
+  PKGBUILD = "bash",
+  html_tags = "html",
+  typescriptreact = "tsx",
+  ["typescript.tsx"] = "tsx",
+  terraform = "hcl",
+  ["html.handlebars"] = "glimmer",
+  systemverilog = "verilog",
+  cls = "latex",
+  sty = "latex",
+  OpenFOAM = "foam",
+  pandoc = "markdown",
+  rmd = "markdown",
+  cs = "c_sharp",
+}
+
 local function get_nodes_in_array(buffer) --{{{
   local ts = vim.treesitter
 
-  -- Yanked from https://github.com/nvim-treesitter/nvim-treesitter/blob/32e364ea3c99aafcce2ce735fe091618f623d889/lua/nvim-treesitter/parsers.lua#L4-L21
-  local filetype_to_parsername = {
-    proto = "c",
-    arduino = "cpp",
-    javascriptreact = "javascript",
-    ecma = "javascript",
-    jsx = "javascript",
-    PKGBUILD = "bash",
-    html_tags = "html",
-    typescriptreact = "tsx",
-    ["typescript.tsx"] = "tsx",
-    terraform = "hcl",
-    ["html.handlebars"] = "glimmer",
-    systemverilog = "verilog",
-    cls = "latex",
-    sty = "latex",
-    OpenFOAM = "foam",
-    pandoc = "markdown",
-    rmd = "markdown",
-    cs = "c_sharp",
-  }
-
   local ok, parser = pcall(ts.get_parser, buffer)
   if not ok then
-    local cur_buf_filetype = vim.bo[buffer].ft
-    parser = ts.get_parser(0, filetype_to_parsername[cur_buf_filetype])
+    parser = ts.get_parser(0, _FILETYPE_TO_PARSERNAME[vim.bo[buffer].ft])
   end
 
   if not parser then
@@ -87,55 +95,111 @@ local function _load(buffer)
 
   vim.api.nvim_buf_clear_namespace(buffer, M._ns, 0, -1)
 
-  local children = {}
-  recursive_child_iter(root, children, { "identifier", "type_identifier", "field_identifier" })
+  -- Find NS for diag once, it does not change while we walk the nodes
+  local diag_ns = nil
+  local diag_idx = next(vim.diagnostic.get_namespaces())
+  if diag_idx then
+    diag_ns = vim.diagnostic.get_namespaces()[diag_idx].user_data.underline_ns
+  end
+
+  local hash_string = require("hash_string")
+  local color_generator = require("color_generator")
+
+  -- Fetch the buffer text once, identifiers are sliced out of these lines
+  local lines = vim.api.nvim_buf_get_lines(buffer, 0, -1, false)
+
+  -- Local aliases for everything touched per node
+  local ns = M._ns
+  local word_cache = M._WORD_CACHE
+  local buf_get_extmarks = vim.api.nvim_buf_get_extmarks
+  local buf_add_highlight = vim.api.nvim_buf_add_highlight
+
+  -- Highlight nodes as the walk finds them instead of collecting them first
+  recursive_child_iter(root, function(nn)
+    local srow, scol, erow, ecol = nn:range()
+    local node_text
+    if srow == erow and lines[srow + 1] then
+      node_text = string.sub(lines[srow + 1], scol + 1, ecol)
+    else
+      node_text = vim.treesitter.get_node_text(nn, buffer)
+    end
 
-  for _, nn in ipairs(children) do
-    local node_text = vim.treesitter.get_node_text(nn, buffer)
     if node_text then
-      local hlname = M._WORD_CACHE[node_text]
+      local hlname = word_cache[node_text]
       if hlname == nil then
-        local hsv = require("hash_string").hash_hsv(node_text)
-        local c = require("color_generator").color_generate(hsv[1], hsv[2], hsv[3])
-        hlname = create_highlight(M._ns, string.sub(c, 2))
+        local hsv = hash_string.hash_hsv(node_text)
+        local c = color_generator.color_generate(hsv[1], hsv[2], hsv[3])
+        hlname = create_highlight(ns, string.sub(c, 2))
       end
 
-      local srow, scol, erow, ecol = vim.treesitter.get_node_range(nn)
-
-      -- Find NS for diag and make sure there isn't extmark exist for the same range already
-      local diag_idx = next(vim.diagnostic.get_namespaces())
+      -- Make sure there isn't extmark exist for the same range already
       local existing_extmark = nil
-      if diag_idx then
-        local diag_ns = vim.diagnostic.get_namespaces()[diag_idx].user_data.underline_ns
-        if diag_ns then
-          existing_extmark = vim.api.nvim_buf_get_extmarks(buffer, diag_ns, { srow, scol }, { erow, ecol }, {})
-        end
+      if diag_ns then
+        existing_extmark = buf_get_extmarks(buffer, diag_ns, { srow, scol }, { erow, ecol }, {})
       end
 
       if existing_extmark == nil or next(existing_extmark) == nil then
-        vim.api.nvim_buf_add_highlight(buffer, M._ns, hlname, srow, scol, ecol)
+        buf_add_highlight(buffer, ns, hlname, srow, scol, ecol)
       end
 
 
-      M._WORD_CACHE[node_text] = hlname
+      word_cache[node_text] = hlname
     end
-  end
+  end, _IDENTIFIER_TYPES)
 
   -- Activate the highlight
   vim.api.nvim_set_hl_ns(M._ns)
 end
 
-local function _autoload(ev)
-  local autocommands = vim.api.nvim_get_autocmds({
-    group = M._semhl_augup,
-    buffer = ev.buf,
-    event = { "BufEnter" }
-  })
+-- Only re-highlight when the text changed since the last load, scrolling,
+-- entering the buffer or switching modes leaves the highlights valid
+M._should_reload = function(buf, tick, event)
+  if event ~= "FileType" and M._LOADED_TICKS[buf] == tick then
+    return false
+  end
+  M._LOADED_TICKS[buf] = tick
+  return true
+end
 
-  if autocommands == nil or next(autocommands) == nil then
+-- New diagnostics invalidate the last load, but while typing the underlines
+-- are not refreshed yet, so leave the reload to ModeChanged on insert leave
+M._on_diagnostic_changed = function(buf, mode)
+  M._LOADED_TICKS[buf] = nil
+  local m = mode:sub(1, 1)
+  return m ~= "i" and m ~= "R"
+end
+
+local function _autoload(ev)
+  -- Track attached buffers ourselves, this runs on every text change so avoid
+  -- asking nvim for the buffer's autocommands each time
+  if not M._ATTACHED_BUFFERS[ev.buf] then
     vim.api.nvim_create_autocmd(
       { "BufEnter", "TextChanged", "TextChangedP", "WinScrolled", "ModeChanged" },
       { buffer = ev.buf, callback = _autoload, group = M._semhl_augup })
+    -- Buffer local autocommands only go away when the buffer is wiped out
+    vim.api.nvim_create_autocmd({ "BufWipeout" }, {
+      buffer = ev.buf,
+      group = M._semhl_augup,
+      callback = function(del_ev)
+        M._ATTACHED_BUFFERS[del_ev.buf] = nil
+        M._LOADED_TICKS[del_ev.buf] = nil
+      end
+    })
+    -- Diagnostics arrive after the edit, re-filter the highlights against them
+    vim.api.nvim_create_autocmd({ "DiagnosticChanged" }, {
+      buffer = ev.buf,
+      group = M._semhl_augup,
+      callback = function(diag_ev)
+        if M._on_diagnostic_changed(diag_ev.buf, vim.api.nvim_get_mode().mode) then
+          _autoload(diag_ev)
+        end
+      end
+    })
+    M._ATTACHED_BUFFERS[ev.buf] = true
+  end
+
+  if not M._should_reload(ev.buf, vim.api.nvim_buf_get_changedtick(ev.buf), ev.event) then
+    return
   end
 
   _load(ev.buf)
@@ -170,6 +234,7 @@ end
 
 M.load = function()
   local buffer = vim.api.nvim_get_current_buf()
+  M._LOADED_TICKS[buffer] = nil
   _autoload({ buf = buffer })
 end
 
@@ -185,6 +250,8 @@ M.unload = function()
   for _, cmd in pairs(autocommands) do
     vim.api.nvim_del_autocmd(cmd.id)
   end
+  M._ATTACHED_BUFFERS[buffer] = nil
+  M._LOADED_TICKS[buffer] = nil
 end
 
 return M
@@ -10,4 +10,43 @@ describe("semhl", function()
     local c2 = C.color_generate()
     assert.falsy(c1 == c2)
   end)
+
+  it("Generate well formed colors", function()
+    local C = require("color_generator")
+    for _, hue in ipairs({ 0, 0.2, 0.4, 0.6, 0.8, 0.99 }) do
+      local c = C.color_generate(hue, 1, 1)
+      assert.truthy(c:match("^#%x%x%x%x%x%x$"))
+    end
+  end)
+
+  it("Reload only when text changed", function()
+    local S = require("semhl")
+    local buf = 1001
+    assert.truthy(S._should_reload(buf, 1, "FileType"))
+    assert.falsy(S._should_reload(buf, 1, "BufEnter"))
+    assert.falsy(S._should_reload(buf, 1, "WinScrolled"))
+    assert.truthy(S._should_reload(buf, 2, "TextChanged"))
+    assert.falsy(S._should_reload(buf, 2, "ModeChanged"))
+    -- FileType always reloads, the parser may have changed
+    assert.truthy(S._should_reload(buf, 2, "FileType"))
+    S._LOADED_TICKS[buf] = nil
+  end)
+
+  it("Reload on diagnostics outside insert mode", function()
+    local S = require("semhl")
+    local buf = 1002
+    assert.truthy(S._should_reload(buf, 1, "FileType"))
+
+    -- Normal mode reloads right away
+    assert.truthy(S._on_diagnostic_changed(buf, "n"))
+    assert.truthy(S._should_reload(buf, 1, "DiagnosticChanged"))
+
+    -- Insert and replace mode defer, the cleared tick forces ModeChanged to reload
+    for _, mode in ipairs({ "i", "ic", "R", "Rv" }) do
+      assert.falsy(S._on_diagnostic_changed(buf, mode))
+      assert.truthy(S._should_reload(buf, 1, "ModeChanged"))
+      assert.falsy(S._should_reload(buf, 1, "ModeChanged"))
+    end
+    S._LOADED_TICKS[buf] = nil
+  end)
 end)